@@ -0,0 +1,396 @@
+# Author: K. Walsh <kwalsh@cs.holycross.edu>
+# Modified by: Apurva, Margaret, Michael :)
+# Date: 4 April 2017
+# Modified: 4 Dec 2020
+#
+# The client side of our TCP-like semi-reliable protocol on top of UDP, shared
+# by client_saw.py (a window of 1 packet, i.e. stop-and-wait) and better.py (a
+# sliding window of several packets).
+#
+# What it does: sends packets 0 up to total-1, keeping up to window packets in
+# flight at once, with timeouts and retransmissions. ACKs may come back in any
+# order. The timeout is adapted from RTT samples taken on every
+# RTT_frequency'th packet (a "probe").
+#
+# Use it like this:
+#   client_core.run("1.2.3.4", 6000, window=5)
+# This will send data to a UDP server at IP address 1.2.3.4 port 6000.
+
+import array
+import socket
+import selectors
+import time
+import struct
+import threading
+import datasource
+import mmsg
+import trace
+
+# setting verbose = 0 turns off most printing
+# setting verbose = 1 turns on a little bit of printing
+# setting verbose = 2 turns on a lot of printing
+# setting verbose = 3 turns on all printing
+verbose = 2
+
+magic = 0xBAADCAFE
+
+# packet header (magic, seqno) and ACK (magic, ackno) formats, compiled once
+HDR = struct.Struct(">II")
+ACK = struct.Struct(">II")
+
+# smallest and largest timeouts we will ever use, in nanoseconds (10 ms and 2 s)
+MIN_RTO = 10000000
+MAX_RTO = 2000000000
+
+# The packet at the bottom of the window is treated as lost (and resent) as
+# soon as ACKs have come back for PACKET_THRESHOLD + reorder_threshold later
+# packets (or for all the others in the window, if it isn't that big), or
+# else once it has gone unACKed for the timeout plus reorder_threshold*srtt/8
+# since it was last sent. reorder_threshold starts at 0 and goes up (to at most
+# MAX_REORDER) each time we find out a retransmission wasn't needed, because
+# the original was only delayed, and back down each time one was needed.
+PACKET_THRESHOLD = 3
+MAX_REORDER = 8
+
+# how big we ask the kernel to make the socket's send and receive buffers
+SOCKET_BUFSIZE = 4*1024*1024
+
+# Send total packets to the server at host:port, with up to window packets in
+# flight at a time, logging them to tracefile (unless it is None).
+def run(host, port, window=1, total=datasource.numPackets, tracefile=None):
+    print("Sending UDP packets to %s:%d" % (host, port))
+    s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM) # Makes a UDP socket!
+    # we only ever talk to the one server, so connect to it once, rather than
+    # giving its address on every send (this also means only packets from
+    # the server get through to us)
+    s.connect((host, port))
+    # ask for big socket buffers, so that a burst of ACKs (or of our own
+    # packets) doesn't overflow them and get dropped, which would look just
+    # like a loss and cause a pointless retransmission
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, SOCKET_BUFSIZE)
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF, SOCKET_BUFSIZE)
+    if verbose >= 1:
+        # the kernel may not give us as much as we asked for
+        print("Socket buffers: %d bytes for receiving, %d bytes for sending" %
+                (s.getsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF),
+                s.getsockopt(socket.SOL_SOCKET, socket.SO_SNDBUF)))
+
+    # per-packet messages are only printed if verbose >= 1, and then only for
+    # the first few packets and every 1000th one (or all of them, if verbose >= 3)
+    print_mask = verbose >= 1
+
+    trace.init(tracefile,
+            "Log of all packets sent and ACKs received by client", 
+            "SeqNo", "TimeSent", "AckNo", "timeACKed",
+            fmt="<IdId")
+
+    start = time.perf_counter_ns()
+    seqno = 0
+
+    # Window size
+    N = window
+
+    # How often to recalculate RTT, making sure it is greater than the window size
+    RTT_frequency = 300 + N 
+    
+    # Which packets in the window have been ACKed, as a bitmask: bit i is set
+    # once we get the ACK for seqno+i
+    window_bits = 0
+
+    # For each packet in the window, indexed by seqno % N: the time it was
+    # first sent, whether it has been resent since (1) or not (0), and if so,
+    # the time it was last resent
+    time_sent = array.array('q', [0]) * N
+    was_resent = array.array('B', [0]) * N
+    time_resent = array.array('q', [0]) * N
+
+    # The packet for each seqno is built ahead of time, by a background
+    # thread, in sendbufs[seqno % RING] (header first, then the payload), and
+    # stays there until it is ACKed, so it can be resent as is. With RING = 2N,
+    # the next N packets after the window are ready to go before we need them.
+    # free counts the buffers the thread may fill, and filled counts the
+    # packets that are ready but haven't been sent yet. If the thread gets an
+    # error, it puts it in failed, and we raise it here instead.
+    RING = 2 * N
+    sendbufs = [bytearray(HDR.size + datasource.packetSize) for i in range(RING)]
+    lengths = array.array('I', [0]) * RING
+    free = threading.Semaphore(RING)
+    filled = threading.Semaphore(0)
+    failed = []
+    t = threading.Thread(target=prefetch, args=(sendbufs, lengths, free, filled, total, failed))
+    t.daemon = True
+    t.start()
+
+    # New packets are queued on the batch and sent together with one system
+    # call whenever we are about to wait for ACKs.
+    batch = mmsg.Batch(s, None, sendbufs, N)
+
+    tStart = time.perf_counter_ns()   # start counting here
+
+    # sending the first N in the window
+    for i in range (0, min(N, total)):
+        # wait for the packet to be ready, and queue it to be sent
+        filled.acquire()
+        if failed:
+            raise failed[0]
+        tSend = time.perf_counter_ns()
+        time_sent[i] = tSend
+        was_resent[i] = 0
+        batch.add(i, lengths[i])
+        if print_mask and (verbose >= 3 or i < 5 or i % 1000 == 0):
+            print("Sent packet with seqno %d" % (i))
+    batch.flush()
+
+    # initial timeout, in nanoseconds (all times here are integer nanoseconds
+    # from a monotonic clock, converted to seconds only when printed or logged)
+    # rto is the timeout calculated from the RTT samples, and timeout is what we
+    # actually use, which is doubled after every retransmission and goes back to
+    # rto when a packet gets ACKed without needing to be resent
+    rto = 500000000
+    timeout = rto
+    # smoothed RTT and RTT variation, set by the first probe sample
+    srtt = None
+    rttvar = None
+    # intial starting time for probe packet
+    starting = time.perf_counter_ns()
+    # every RTT_frequency'th packet is a probe: the next one we will send, and
+    # the one whose ACK we are waiting for
+    next_probe_send = RTT_frequency
+    next_probe_ack = RTT_frequency
+    # whether the current probe packet has been resent (Karn's rule says not
+    # to take an RTT sample from it, since we can't tell which copy got ACKed)
+    probe_retransmitted = False
+    # how much reordering we have seen, see PACKET_THRESHOLD above
+    reorder_threshold = 0
+    # the shortest RTT of any packet that was ACKed without being resent, so
+    # an ACK that comes back much sooner than that after a resend (in less
+    # than half of it, to allow for a resend going out on its own, on an
+    # otherwise empty path) must be for the original, not the resend
+    min_rtt = None
+    # the timeout from before the most recent backoff, so we can undo it if
+    # that retransmission turns out to have been spurious
+    timeout_before_backoff = None
+    # how long the next select() waits: normally the timeout, but less when
+    # we are giving a late packet a little extra time (see PACKET_THRESHOLD)
+    wait = timeout
+
+    # Wait for ACKs using a selector (epoll, on Linux) and a non-blocking
+    # socket, so a single wait covers the whole timeout, and once something
+    # arrives we can read every ACK that is already queued up before waiting
+    # again.
+    s.setblocking(False)
+    sel = selectors.DefaultSelector()
+    sel.register(s, selectors.EVENT_READ)
+    acks = mmsg.Receiver(s, N, ACK.size)
+
+    # Everything used on every packet in the loop below is looked up once
+    # here and kept in a local variable, which is faster for Python to get at
+    # than a global or an attribute
+    clock = time.perf_counter_ns
+    tracewrite = trace.write
+    unpack_acks = ACK.iter_unpack
+    unpack_ack = ACK.unpack_from
+    acksize = ACK.size
+    select = sel.select
+    recv_acks = acks.recv
+    ackview = acks.view
+    ackfirst = acks.first
+    acklengths = acks.lengths
+    acks_whole = acks.whole
+    maxacks = acks.count
+    send = batch.add
+    flush = batch.flush
+    wait_filled = filled.acquire
+    release_free = free.release
+
+    while seqno < total:
+        if not select(wait / 1e9):
+            #... no packets are ready to be received ...
+            # decide whether the bottom packet is lost, or maybe just late
+            k = seqno % N
+            tLast = time_resent[k] if was_resent[k] else time_sent[k]
+            deadline = tLast + timeout
+            if srtt is not None:
+                deadline += reorder_threshold * srtt // 8
+            now = clock()
+            if now < deadline:
+                # give it until the deadline
+                wait = deadline - now
+                continue
+
+            # back off, in case the timeout was too short
+            timeout_before_backoff = timeout
+            timeout = min(MAX_RTO, timeout * 2)
+            wait = timeout
+
+            # if resending a probe packet, don't use it for an RTT sample
+            if seqno == next_probe_ack:
+                probe_retransmitted = True
+
+            # the packet is still sitting in its buffer, so just resend it
+            tSend = clock()
+            was_resent[k] = 1
+            time_resent[k] = tSend
+            send(seqno % RING, lengths[seqno % RING])
+            flush()
+            if print_mask and (verbose >= 3 or seqno < 5 or seqno % 1000 == 0):
+                print("Sent packet with seqno %d" % (seqno))
+            continue
+
+        #... messages received in time, first record every one that is
+        # waiting, reading as many as we can with each system call ...
+        while True:
+            try:
+                count = recv_acks()
+            except socket.error:
+                break
+            if count == 0:
+                break
+            tRecv = clock()
+            # unpack integers from the ACK packets, all at once (in C, with
+            # iter_unpack) if they are all the right size, otherwise just the
+            # ones that are (anything else isn't an ACK, or got cut short),
+            # then deal with each ACK in turn
+            if acks_whole(count):
+                ackpkts = unpack_acks(ackfirst[count])
+            else:
+                ackpkts = [unpack_ack(ackview, i*acksize) for i in range(count)
+                        if acklengths[i] == acksize]
+            for (magack, ackno) in ackpkts:
+                if print_mask and (verbose >= 3 or seqno < 5 or seqno % 1000 == 0):
+                    print("Got ack with seqno %d" % (ackno))
+
+                # if this is an ack for a probe packet, calculate how long it took
+                if ackno == next_probe_ack:
+                    next_probe_ack += RTT_frequency
+                    if not probe_retransmitted:
+                        total_time = clock() - starting
+                        if srtt is None:
+                            srtt = total_time
+                            rttvar = total_time // 2
+                        else:
+                            err = total_time - srtt
+                            srtt += err // 8
+                            rttvar += (abs(err) - rttvar) // 4
+                        rto = min(MAX_RTO, max(MIN_RTO, srtt + 4*rttvar))
+                        timeout = rto
+
+                # write info about the packet and the ACK to the log file
+                tracewrite(seqno, (tSend - start) / 1e9, ackno, (tRecv - start) / 1e9)
+
+                # whatever ack that we received, record it (as long as it is in the
+                # window and we haven't had it already, anything else is a
+                # duplicate, e.g. for both copies of a resent packet)
+                if seqno <= ackno < seqno + N:
+                    bit = 1 << (ackno - seqno)
+                    if window_bits & bit:
+                        continue
+                    window_bits |= bit
+
+                    k = ackno % N
+                    if not was_resent[k]:
+                        # a clean ACK, so the path is working again: stop
+                        # backing off
+                        timeout = rto
+                        timeout_before_backoff = None
+                        rtt = tRecv - time_sent[k]
+                        if min_rtt is None or rtt < min_rtt:
+                            min_rtt = rtt
+                    elif min_rtt is not None and tRecv - time_resent[k] < min_rtt // 2:
+                        # we resent this packet, but the ACK came back so soon
+                        # after the resend that it can't be for it (it must be
+                        # for the original), so the resend was spurious: undo
+                        # the backoff and allow more reordering
+                        if timeout_before_backoff is not None:
+                            timeout = timeout_before_backoff
+                            timeout_before_backoff = None
+                        reorder_threshold = min(MAX_REORDER, reorder_threshold + 1)
+                        was_resent[k] = 0
+                    elif reorder_threshold > 0:
+                        # the resend was needed, so waiting any longer for it
+                        # wouldn't have helped: allow less reordering
+                        reorder_threshold -= 1
+
+            if count < maxacks:
+                break
+
+        # ... if the bottom packet is still missing, but enough later ones have
+        # been ACKed (see PACKET_THRESHOLD), it was most likely lost, so resend
+        # it now rather than waiting for the timeout (but only once, after that
+        # it's up to the timeout)
+        if N > 1 and not window_bits & 1:
+            k = seqno % N
+            if (not was_resent[k] and bin(window_bits).count("1") >=
+                    min(N - 1, PACKET_THRESHOLD + reorder_threshold)):
+                if seqno == next_probe_ack:
+                    probe_retransmitted = True
+                was_resent[k] = 1
+                time_resent[k] = clock()
+                send(seqno % RING, lengths[seqno % RING])
+                if print_mask and (verbose >= 3 or seqno < 5 or seqno % 1000 == 0):
+                    print("Sent packet with seqno %d" % (seqno))
+
+        # ... then, with all the waiting ACKs recorded, if the bottom of our
+        # window got ACKed, move window up so that the bottom equals the lowest
+        # seqno we are still waiting for, i.e. past all the trailing 1 bits
+        # (the lowest 0 bit of window_bits is the lowest 1 bit of
+        # ~window_bits & (window_bits+1)), and refill it in one batch
+        shift = (~window_bits & (window_bits+1)).bit_length() - 1
+        if shift > 0:
+            # Send seqno+N up to seqno+N+shift-1 (if there are that many left)
+            for nxt in range(seqno+N, min(seqno+N+shift, total)):
+                slot = nxt % RING
+                wait_filled()
+                if failed:
+                    raise failed[0]
+                tSend = clock()
+                time_sent[nxt % N] = tSend
+                was_resent[nxt % N] = 0
+
+                # If this is a probe packet, start the timer
+                if nxt == next_probe_send:
+                    next_probe_send += RTT_frequency
+                    starting = clock()
+                    probe_retransmitted = False
+
+                send(slot, lengths[slot])
+                if print_mask and (verbose >= 3 or nxt < 5 or nxt % 1000 == 0):
+                    print("Sent packet with seqno %d" % (nxt))
+
+            # Shift up both ends of the window, and let the background
+            # thread reuse the buffers of the packets that got ACKed
+            window_bits >>= shift
+            seqno += shift
+            release_free(shift)
+        flush()
+        wait = timeout
+
+
+    end = time.perf_counter_ns()
+    elapsed = (end - start) / 1e9
+    print("Finished sending all packets!")
+    print("Elapsed time: %0.4f s" % (elapsed))
+    trace.close()
+
+
+# Runs in the background, building the packets for seqno 0 up to total-1 in
+# turn into bufs[seqno % len(bufs)], and recording each packet's length in
+# lengths. Before filling a buffer it waits on free, and after filling it it
+# signals filled. If getting the data fails, it appends the exception to
+# failed and signals filled anyway (so the client isn't left waiting forever
+# for a packet that will never come), then stops.
+def prefetch(bufs, lengths, free, filled, total, failed):
+    seqno = 0
+    while seqno < total:
+        free.acquire()
+        slot = seqno % len(bufs)
+        try:
+            HDR.pack_into(bufs[slot], 0, magic, seqno)
+            lengths[slot] = HDR.size + datasource.wait_for_data_into(bufs[slot], HDR.size, seqno)
+        except BaseException as e:
+            failed.append(e)
+            filled.release()
+            return
+        filled.release()
+        seqno += 1
+
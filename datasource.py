@@ -24,6 +24,7 @@ height = 360
 numFrames = 500
 
 numPackets = numFrames * height # 180000
+packetSize = width * 3 # 1440 bytes of payload in each packet
 
 # This function returns example payload data for a given sequence number.
 def wait_for_data(seqno):
@@ -43,6 +44,14 @@ def wait_for_data(seqno):
     else:
         return get_image_packet(img0, y)
 
+# Same as wait_for_data(), but copies the payload into buf starting at offset,
+# so a caller can keep reusing one buffer. Returns the length of the payload.
+def wait_for_data_into(buf, offset, seqno):
+    body = wait_for_data(seqno)
+    n = len(body)
+    buf[offset:offset+n] = body
+    return n
+
 # If the program is ever killed using Control-C, save the trace before quitting.
 def signal_handler(signal, frame):
     print("Exiting...")
@@ -0,0 +1,210 @@
+# Batched UDP sending and receiving for the client, using the Linux sendmmsg()
+# and recvmmsg() system calls.
+#
+# Python's socket module has neither, so we call the ones in libc through
+# ctypes. A Batch is set up once with a list of packet buffers (bytearrays that
+# are never resized). Then add() queues "send the first length bytes of buffer
+# i", and flush() hands everything queued to the kernel in a single system
+# call, instead of one sendto() per packet. A Receiver does the opposite: one
+# call to recv() reads every packet that is waiting (up to a limit) into its
+# own preallocated buffers.
+#
+# If these calls are not available (not Linux, or the kernel says ENOSYS), we
+# fall back to one sendto() or recvmsg_into() per packet, so callers don't need to
+# care.
+
+import array
+import ctypes
+import errno
+import os
+import socket
+
+class iovec(ctypes.Structure):
+    _fields_ = [("iov_base", ctypes.c_void_p),
+                ("iov_len", ctypes.c_size_t)]
+
+class msghdr(ctypes.Structure):
+    _fields_ = [("msg_name", ctypes.c_void_p),
+                ("msg_namelen", ctypes.c_uint32),
+                ("msg_iov", ctypes.POINTER(iovec)),
+                ("msg_iovlen", ctypes.c_size_t),
+                ("msg_control", ctypes.c_void_p),
+                ("msg_controllen", ctypes.c_size_t),
+                ("msg_flags", ctypes.c_int)]
+
+class mmsghdr(ctypes.Structure):
+    _fields_ = [("msg_hdr", msghdr),
+                ("msg_len", ctypes.c_uint)]
+
+class sockaddr_in(ctypes.Structure):
+    _fields_ = [("sin_family", ctypes.c_ushort),
+                ("sin_port", ctypes.c_uint16),
+                ("sin_addr", ctypes.c_uint8 * 4),
+                ("sin_zero", ctypes.c_uint8 * 8)]
+
+# Find sendmmsg() and recvmmsg() in libc, if there are any.
+try:
+    libc = ctypes.CDLL(None, use_errno=True)
+except (OSError, TypeError):
+    libc = None
+try:
+    sendmmsg = libc.sendmmsg
+    sendmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int]
+    sendmmsg.restype = ctypes.c_int
+except AttributeError:
+    sendmmsg = None
+try:
+    recvmmsg = libc.recvmmsg
+    recvmmsg.argtypes = [ctypes.c_int, ctypes.POINTER(mmsghdr), ctypes.c_uint, ctypes.c_int, ctypes.c_void_p]
+    recvmmsg.restype = ctypes.c_int
+except AttributeError:
+    recvmmsg = None
+
+class Batch:
+
+    # sock is the UDP socket, addr is the (host, port) to send to (or None if
+    # sock is already connected to it), bufs is the list of packet buffers, and
+    # size is how many packets to queue up before add() flushes them
+    # automatically.
+    def __init__(self, sock, addr, bufs, size):
+        self.sock = sock
+        self.addr = addr
+        self.bufs = bufs
+        self.size = size
+        self.queued = []   # buffer indexes and lengths, for the sendto() fallback
+        self.use_sendmmsg = sendmmsg is not None
+
+        self.views = [memoryview(buf) for buf in bufs]
+        # the address of each buffer never changes, so look them up once
+        self.cbufs = [(ctypes.c_char * len(buf)).from_buffer(buf) for buf in bufs]
+        if addr is not None:
+            self.name = sockaddr_in(socket.AF_INET, socket.htons(addr[1]),
+                    (ctypes.c_uint8 * 4)(*socket.inet_aton(socket.gethostbyname(addr[0]))))
+        self.iov = (iovec * size)()
+        self.msgs = (mmsghdr * size)()
+        for i in range(size):
+            m = self.msgs[i].msg_hdr
+            if addr is not None:
+                m.msg_name = ctypes.addressof(self.name)
+                m.msg_namelen = ctypes.sizeof(self.name)
+            m.msg_iov = ctypes.pointer(self.iov[i])
+            m.msg_iovlen = 1
+
+    # Queue the first length bytes of bufs[i] to be sent. The buffer must not
+    # be changed until the next flush().
+    def add(self, i, length):
+        n = len(self.queued)
+        self.iov[n].iov_base = ctypes.addressof(self.cbufs[i])
+        self.iov[n].iov_len = length
+        self.queued.append((i, length))
+        if n+1 >= self.size:
+            self.flush()
+
+    # Send everything that has been queued.
+    def flush(self):
+        count = len(self.queued)
+        sent = 0
+        while self.use_sendmmsg and sent < count:
+            first = ctypes.byref(self.msgs, sent * ctypes.sizeof(mmsghdr))
+            n = sendmmsg(self.sock.fileno(), ctypes.cast(first, ctypes.POINTER(mmsghdr)), count - sent, 0)
+            if n < 0:
+                err = ctypes.get_errno()
+                if err == errno.EINTR:
+                    continue
+                if err == errno.ENOSYS:
+                    self.use_sendmmsg = False
+                    break
+                if err in (errno.EAGAIN, errno.EWOULDBLOCK, errno.ECONNREFUSED):
+                    # the socket's send buffer is full (or, for a connected
+                    # socket, an earlier packet bounced), so the rest are lost,
+                    # just as if the network had dropped them
+                    self.queued = []
+                    return
+                self.queued = []
+                raise OSError(err, os.strerror(err))
+            sent += n
+        for (i, length) in self.queued[sent:]:
+            try:
+                if self.addr is None:
+                    self.sock.send(self.views[i][:length])
+                else:
+                    self.sock.sendto(self.views[i][:length], self.addr)
+            except (BlockingIOError, ConnectionRefusedError):
+                break
+        self.queued = []
+
+class Receiver:
+
+    # sock is the UDP socket, count is the most packets one recv() will read,
+    # and bufsize is how much of each packet to keep (longer packets get
+    # truncated).
+    def __init__(self, sock, count, bufsize):
+        self.sock = sock
+        self.count = count
+        self.bufsize = bufsize
+        self.use_recvmmsg = recvmmsg is not None
+
+        # Packet i goes in data[i*bufsize:(i+1)*bufsize]. Keeping them all in
+        # one buffer means that when every packet is exactly bufsize bytes
+        # (like our ACKs), a whole batch of n can be unpacked in one go with
+        # struct's iter_unpack(first[n]), where first[n] is view[:n*bufsize].
+        self.data = bytearray(bufsize * count)
+        self.view = memoryview(self.data)
+        self.first = [self.view[:n*bufsize] for n in range(count+1)]
+        base = ctypes.addressof((ctypes.c_char * len(self.data)).from_buffer(self.data))
+        self.iov = (iovec * count)()
+        self.msgs = (mmsghdr * count)()
+        for i in range(count):
+            self.iov[i].iov_base = base + i * bufsize
+            self.iov[i].iov_len = bufsize
+            m = self.msgs[i].msg_hdr
+            m.msg_iov = ctypes.pointer(self.iov[i])
+            m.msg_iovlen = 1
+        # After recv() returns n, lengths[i] is how many bytes packet i had, for
+        # i up to n-1, which is more than bufsize if it didn't fit and got
+        # truncated (so only a length of exactly bufsize means
+        # data[i*bufsize:(i+1)*bufsize] holds one whole packet). It is a view
+        # straight onto the msg_len field of each mmsghdr, which recvmmsg()
+        # fills in, so recv() doesn't have to copy anything.
+        words = memoryview(self.msgs).cast('B').cast('I')
+        stride = ctypes.sizeof(mmsghdr) // words.itemsize
+        self.lengths = words[mmsghdr.msg_len.offset // words.itemsize::stride]
+        # the first n lengths, and n copies of bufsize to compare them with,
+        # for whole(), sliced here once so that it doesn't make new ones
+        full = memoryview(array.array('I', [bufsize]) * count)
+        self.compare = [(self.lengths[:n], full[:n]) for n in range(count+1)]
+
+    # Read all the packets that are waiting, without blocking, and return how
+    # many there were (0 if there were none).
+    def recv(self):
+        while self.use_recvmmsg:
+            # with MSG_TRUNC, msg_len is the whole length of each packet,
+            # even the ones that got truncated
+            n = recvmmsg(self.sock.fileno(), self.msgs, self.count,
+                    socket.MSG_DONTWAIT | socket.MSG_TRUNC, None)
+            if n >= 0:
+                return n
+            err = ctypes.get_errno()
+            if err == errno.EINTR:
+                continue
+            if err in (errno.EAGAIN, errno.EWOULDBLOCK):
+                return 0
+            if err == errno.ENOSYS:
+                self.use_recvmmsg = False
+                break
+            raise OSError(err, os.strerror(err))
+        try:
+            (nbytes, ancdata, flags, addr) = self.sock.recvmsg_into([self.view[:self.bufsize]], 0, socket.MSG_DONTWAIT)
+        except BlockingIOError:
+            return 0
+        if flags & socket.MSG_TRUNC:
+            nbytes = self.bufsize + 1
+        self.lengths[0] = nbytes
+        return 1
+
+    # Return whether each of the first n packets read by the last recv() was
+    # exactly bufsize bytes. The lengths are compared all at once, by the
+    # memoryview comparison in C.
+    def whole(self, n):
+        (lengths, full) = self.compare[n]
+        return lengths == full
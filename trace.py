@@ -8,30 +8,85 @@
 # The first line is a title.
 # The second line is the title for each column.
 # The rest of the lines contain the data.
+#
+# If init() is given a struct format for the rows (e.g. fmt="<IdId"), write()
+# doesn't format any text. Instead it packs each row into a big in-memory
+# buffer, full buffers are written to a temporary binary file by a background
+# thread, and close() converts the binary file into the same CSV as usual.
+
+import os
+import struct
+import threading
+from queue import Queue
 
 csv = None
 csvname = None
 
-def init(filename, title, *args):
-    global csv, csvname
+# size of each in-memory buffer of binary rows
+bufsize = 1024*1024
+
+rec = None      # struct.Struct for a row, or None to write CSV text directly
+buf = None      # buffer being filled with rows
+off = 0         # how much of buf has been filled
+full = None     # queue of (buffer, length) for the writer thread
+writer = None   # background thread writing full buffers to the binary file
+
+def init(filename, title, *args, fmt=None):
+    global csv, csvname, rec, buf, off, full, writer
     if filename is not None:
         csv = open(filename, "w")
         csv.write("#" + title + "\n")
         csv.write("#" + (",".join(args)) + "\n")
         csvname = filename
+        if fmt is not None:
+            rec = struct.Struct(fmt)
+            buf = bytearray(bufsize)
+            off = 0
+            full = Queue()
+            writer = threading.Thread(target=write_buffers, args=(open(filename + ".bin", "wb"), full))
+            writer.daemon = True
+            writer.start()
         print("**** Data will be saved to %s ****" % (csvname))
 
 def write(*args):
-    global csv
-    if csv is not None:
+    global csv, buf, off
+    if rec is not None:
+        rec.pack_into(buf, off, *args)
+        off += rec.size
+        if off + rec.size > len(buf):
+            full.put((buf, off))
+            buf = bytearray(bufsize)
+            off = 0
+    elif csv is not None:
         csv.write(",".join([str(a) for a in args]) + "\n")
 
 def close():
-    global csv, csvname
+    global csv, csvname, rec, buf, off, full, writer
     if csv is not None:
+        if rec is not None:
+            # hand over the last partial buffer, wait for the writer to finish,
+            # then turn the binary rows into CSV text
+            full.put((buf, off))
+            full.put(None)
+            writer.join()
+            with open(csvname + ".bin", "rb") as f:
+                for row in rec.iter_unpack(f.read()):
+                    csv.write(",".join([str(a) for a in row]) + "\n")
+            os.remove(csvname + ".bin")
+            rec = buf = full = writer = None
+            off = 0
         csv.close()
         csv = None
         print("**** Data saved to %s ****" % (csvname))
     else:
         print("**** No data saved, because tracefile = None ****")
 
+# Runs in the background, writing each full buffer to the binary file f.
+def write_buffers(f, full):
+    while True:
+        item = full.get()
+        if item is None:
+            break
+        (data, length) = item
+        f.write(memoryview(data)[:length])
+    f.close()